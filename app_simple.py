@@ -3,7 +3,6 @@ import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from collections import defaultdict
 
 st.set_page_config(page_title="Replication Dynamics Game", layout="wide")
 st.title("🎮 Replication Dynamics Game")
@@ -24,33 +23,33 @@ payoff_matrix = {
     "TWEETYPIE":   {"DOVE": -0.5, "HAWK": 3,    "GRIM": -1,   "TIT-FOR-TAT": 2,    "TAT-FOR-TIT": 2,    "TWEEDLEDUM": 2,    "TWEEDLEDEE": 2,    "TWEETYPIE": 2},
 }
 
+# Same payoffs as an ndarray (row = player, column = opponent) for vectorized play
+payoff_array = np.array(
+    [[payoff_matrix[player][opponent] for opponent in automatons] for player in automatons],
+    dtype=np.float64
+)
+
 def simulate_replication_dynamics(num_periods=100):
     n_automatons = len(automatons)
     probabilities = np.ones(n_automatons) / n_automatons
-    history = [probabilities.copy()]
-    payoff_history = defaultdict(list)
+    history = np.empty((num_periods + 1, n_automatons))
+    history[0] = probabilities
+    payoff_history = np.empty((num_periods, n_automatons))
     
     for period in range(num_periods):
-        payoffs = np.zeros(n_automatons)
-        
-        for i, automaton_i in enumerate(automatons):
-            for j, automaton_j in enumerate(automatons):
-                payoffs[i] += payoff_matrix[automaton_i][automaton_j] * probabilities[j]
+        payoffs = payoff_array @ probabilities
         
-        for i, automaton in enumerate(automatons):
-            payoff_history[automaton].append(payoffs[i])
+        payoff_history[period] = payoffs
         
-        min_payoff = np.min(payoffs)
-        if min_payoff < 0:
-            payoffs_adjusted = payoffs - min_payoff + 1
-        else:
-            payoffs_adjusted = payoffs + 1
+        # Shift by the negative part of the minimum only: no branch needed.
+        # Updated in place (payoffs were already recorded) to avoid temporaries.
+        np.add(payoffs, 1.0 - min(payoffs.min(), 0.0), out=payoffs)
         
-        probabilities = probabilities * payoffs_adjusted
-        probabilities = probabilities / np.sum(probabilities)
-        history.append(probabilities.copy())
+        np.multiply(probabilities, payoffs, out=probabilities)
+        probabilities /= probabilities.sum()
+        history[period + 1] = probabilities
     
-    return np.array(history), payoff_history
+    return history, payoff_history
 
 # Sidebar
 with st.sidebar:
@@ -101,15 +100,13 @@ if "done" in st.session_state and st.session_state.done:
     evolution_df = pd.DataFrame(history, columns=automatons)
     evolution_df['Period'] = range(len(history))
     
-    fig_evolution = go.Figure()
-    for automaton in automatons:
-        fig_evolution.add_trace(go.Scatter(
-            x=evolution_df['Period'],
-            y=evolution_df[automaton],
-            mode='lines',
-            name=automaton,
-            stackgroup='one'
-        ))
+    # Wide-form px.area stacks one area per automaton column in a single call
+    fig_evolution = px.area(
+        evolution_df,
+        x='Period',
+        y=automatons,
+        labels={'variable': 'Automaton'}
+    )
     
     fig_evolution.update_layout(
         title="Probability Evolution (Stacked)",
@@ -120,17 +117,18 @@ if "done" in st.session_state and st.session_state.done:
     st.plotly_chart(fig_evolution, use_container_width=True)
     
     st.subheader("Payoffs Over Time")
-    payoff_df = pd.DataFrame(payoff_history)
+    payoff_df = pd.DataFrame(payoff_history, columns=automatons)
     payoff_df['Period'] = range(len(payoff_df))
     
-    fig_payoff = go.Figure()
-    for automaton in automatons:
-        fig_payoff.add_trace(go.Scatter(
+    fig_payoff = go.Figure(data=[
+        go.Scatter(
             x=payoff_df['Period'],
             y=payoff_df[automaton],
             mode='lines',
             name=automaton
-        ))
+        )
+        for automaton in automatons
+    ])
     
     fig_payoff.update_layout(
         title="Average Payoffs",
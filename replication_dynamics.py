@@ -3,7 +3,6 @@ import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.express as px
-from collections import defaultdict
 
 # Set page config
 st.set_page_config(
@@ -51,6 +50,12 @@ payoff_matrix = {
     "TWEETYPIE":   {"DOVE": -0.5, "HAWK": 3,    "GRIM": -1,   "TIT-FOR-TAT": 2,    "TAT-FOR-TIT": 2,    "TWEEDLEDUM": 2,    "TWEEDLEDEE": 2,    "TWEETYPIE": 2},
 }
 
+# Same payoffs as an ndarray (row = player, column = opponent) for vectorized play
+payoff_array = np.array(
+    [[payoff_matrix[player][opponent] for opponent in automatons] for player in automatons],
+    dtype=np.float64
+)
+
 def simulate_replication_dynamics(num_periods=100):
     """
     Simulate replication dynamics where:
@@ -64,40 +69,32 @@ def simulate_replication_dynamics(num_periods=100):
     probabilities = np.ones(n_automatons) / n_automatons
     
     # Track history
-    history = []
-    history.append(probabilities.copy())
+    history = np.empty((num_periods + 1, n_automatons))
+    history[0] = probabilities
     
-    # Track payoffs for each automaton
-    payoff_history = defaultdict(list)
+    # Track payoffs for each automaton: [period, automaton]
+    payoff_history = np.empty((num_periods, n_automatons))
     
     for period in range(num_periods):
-        # Calculate payoffs for each automaton in this round
-        payoffs = np.zeros(n_automatons)
-        
-        for i, automaton_i in enumerate(automatons):
-            # Each automaton plays against all others weighted by their probabilities
-            for j, automaton_j in enumerate(automatons):
-                payoffs[i] += payoff_matrix[automaton_i][automaton_j] * probabilities[j]
+        # Calculate payoffs for each automaton in this round:
+        # each automaton plays against all others weighted by their probabilities
+        payoffs = payoff_array @ probabilities
         
         # Store payoffs
-        for i, automaton in enumerate(automatons):
-            payoff_history[automaton].append(payoffs[i])
+        payoff_history[period] = payoffs
         
         # Reweighting based on payoffs
-        # Normalize payoffs to be positive (add constant if needed)
-        min_payoff = np.min(payoffs)
-        if min_payoff < 0:
-            payoffs_adjusted = payoffs - min_payoff + 1
-        else:
-            payoffs_adjusted = payoffs + 1
-        
-        # Update probabilities proportional to payoffs
-        probabilities = probabilities * payoffs_adjusted
-        probabilities = probabilities / np.sum(probabilities)
-        
-        history.append(probabilities.copy())
+        # Normalize payoffs to be positive (shift by the negative part of the minimum).
+        # Done in place since the payoffs were already stored above.
+        np.add(payoffs, 1.0 - min(payoffs.min(), 0.0), out=payoffs)
+        
+        # Update probabilities proportional to payoffs, in place
+        np.multiply(probabilities, payoffs, out=probabilities)
+        probabilities /= probabilities.sum()
+        
+        history[period + 1] = probabilities
     
-    return np.array(history), payoff_history
+    return history, payoff_history
 
 def main():
     # Sidebar
@@ -198,18 +195,14 @@ def main():
         evolution_df = pd.DataFrame(history, columns=automatons)
         evolution_df['Period'] = range(len(history))
         
-        fig_evolution = go.Figure()
-        
-        colors = px.colors.qualitative.Set2
-        for idx, automaton in enumerate(automatons):
-            fig_evolution.add_trace(go.Scatter(
-                x=evolution_df['Period'],
-                y=evolution_df[automaton],
-                mode='lines',
-                name=automaton,
-                stackgroup='one',
-                fillcolor=colors[idx % len(colors)]
-            ))
+        # Wide-form px.area stacks one area per automaton column in a single call
+        fig_evolution = px.area(
+            evolution_df,
+            x='Period',
+            y=automatons,
+            color_discrete_sequence=px.colors.qualitative.Set2,
+            labels={'variable': 'Automaton'}
+        )
         
         fig_evolution.update_layout(
             title="Probability Evolution (Stacked Area)",
@@ -227,19 +220,19 @@ def main():
         # Payoff evolution
         st.markdown("### Average Payoffs Over Time")
         
-        payoff_df = pd.DataFrame(payoff_history)
+        payoff_df = pd.DataFrame(payoff_history, columns=automatons)
         payoff_df['Period'] = range(len(payoff_df))
         
-        fig_payoff = go.Figure()
-        
-        for idx, automaton in enumerate(automatons):
-            fig_payoff.add_trace(go.Scatter(
+        fig_payoff = go.Figure(data=[
+            go.Scatter(
                 x=payoff_df['Period'],
                 y=payoff_df[automaton],
                 mode='lines+markers',
                 name=automaton,
                 line=dict(width=2)
-            ))
+            )
+            for automaton in automatons
+        ])
         
         fig_payoff.update_layout(
             title="Payoff Evolution",
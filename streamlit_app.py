@@ -3,15 +3,16 @@ import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from collections import defaultdict
+from numba import njit
 
 # Replication Dynamics Game - Latest Version
 st.set_page_config(page_title="Replication Dynamics Game", layout="wide")
 st.title("🎮 Replication Dynamics Game")
 
-# Define the automatons
-automatons = ["DOVE", "HAWK", "GRIM", "TIT-FOR-TAT", "TAT-FOR-TIT", 
-              "TWEEDLEDUM", "TWEEDLEDEE", "TWEETYPIE"]
+# Define the automatons (position -> name). The simulation works on integer positions
+# only; names are attached when building tables and chart legends.
+automatons = ("DOVE", "HAWK", "GRIM", "TIT-FOR-TAT", "TAT-FOR-TIT", 
+              "TWEEDLEDUM", "TWEEDLEDEE", "TWEETYPIE")
 
 # Default Payoff matrix
 default_payoff_matrix = {
@@ -25,66 +26,102 @@ default_payoff_matrix = {
     "TWEETYPIE":   {"DOVE": -0.5, "HAWK": 3,    "GRIM": -1,   "TIT-FOR-TAT": 2,    "TAT-FOR-TIT": 2,    "TWEEDLEDUM": 2,    "TWEEDLEDEE": 2,    "TWEETYPIE": 2},
 }
 
-def simulate_replication_dynamics(num_periods=100, payoff_matrix=None):
-    if payoff_matrix is None:
-        payoff_matrix = default_payoff_matrix
-    
-    n_automatons = len(automatons)
-    probabilities = np.ones(n_automatons) / n_automatons
-    history = [probabilities.copy()]
-    payoff_history = defaultdict(list)
-    strategy_history = []
-    payoff_matrices = []
-    pairwise_payoffs_history = []  # Track pairwise payoffs for each round
+def payoff_matrix_to_array(payoff_matrix):
+    # Row = player, column = opponent, both in `automatons` order.
+    # float32 is plenty for probabilities in [0, 1] and small bounded payoffs.
+    return np.array(
+        [[payoff_matrix[player][opponent] for opponent in automatons] for player in automatons],
+        dtype=np.float32
+    )
+
+default_payoff_array = payoff_matrix_to_array(default_payoff_matrix)
+
+@njit(cache=True, fastmath=True)
+def _simulate(payoff_array, num_periods):
+    # Whole time loop runs compiled; returns (history, payoffs).
+    # Pairwise payoffs are not stored: they are payoff_array * history[period].
+    n_automatons = payoff_array.shape[0]
+    # float32 constants keep every intermediate in float32
+    zero = np.float32(0.0)
+    one = np.float32(1.0)
+    # Largest deviation of any surviving strategy's growth factor from 1 that counts
+    # as a rest point; stopping can then drift by at most num_periods * tolerance
+    # (relative), i.e. 2e-6 at 200 periods. Being below float32 resolution, this
+    # mostly catches exact ties; float32 fixed points are caught by the exact check.
+    tolerance = 1e-8
+    probabilities = np.ones(n_automatons, dtype=np.float32) / np.float32(n_automatons)
+    history = np.empty((num_periods + 1, n_automatons), dtype=np.float32)
+    history[0] = probabilities
+    payoff_history = np.empty((num_periods, n_automatons), dtype=np.float32)
+    payoffs = np.empty(n_automatons, dtype=np.float32)
     
     for period in range(num_periods):
-        payoffs = np.zeros(n_automatons)
-        
-        # Store pairwise payoffs for this period
-        pairwise_payoffs_period = pd.DataFrame(
-            0.0,
-            index=automatons,
-            columns=automatons
-        )
-        
-        for i, automaton_i in enumerate(automatons):
-            for j, automaton_j in enumerate(automatons):
-                pairwise_payoff = payoff_matrix[automaton_i][automaton_j] * probabilities[j]
-                pairwise_payoffs_period.loc[automaton_i, automaton_j] = pairwise_payoff
-                payoffs[i] += pairwise_payoff
-        
-        pairwise_payoffs_history.append(pairwise_payoffs_period)
-        
-        # Store current payoff matrix with period starting from t=0
-        payoff_matrix_period = pd.DataFrame(
-            payoffs.reshape(-1, 1),
-            index=automatons,
-            columns=[f"t={period}"]
-        )
-        payoff_matrices.append(payoff_matrix_period)
+        # payoffs = payoff_array @ probabilities, fused into one pass so no pairwise
+        # temporary is built (numba's @ would also need SciPy for BLAS)
+        for i in range(n_automatons):
+            total = zero
+            for j in range(n_automatons):
+                total += payoff_array[i, j] * probabilities[j]
+            payoffs[i] = total
+        payoff_history[period] = payoffs
         
-        # Determine dominant strategy for each automaton
-        period_strategies = {}
-        for i, automaton in enumerate(automatons):
-            best_opponent_idx = np.argmax([payoff_matrix[automaton][opp] for opp in automatons])
-            period_strategies[automaton] = automatons[best_opponent_idx]
+        # Shift by the negative part of the minimum only: no branch needed.
+        # The shift must use this period's minimum: a fixed shift (e.g. from
+        # payoff_array.min()) changes the payoff ratios and so the dynamics.
+        # Updated in place (numba takes `out` positionally) to avoid temporaries.
+        np.add(payoffs, one - min(payoffs.min(), zero), payoffs)
         
-        strategy_history.append(period_strategies)
+        # Rest point test: each strategy is reweighted by payoffs[i] / mean payoff, so
+        # the distribution is fixed only if that factor is ~1 for every strategy still
+        # present, however small its probability (a tiny invader can still take over).
+        # Strategies at exactly 0 can never come back. Loops avoid temporaries.
+        weighted_payoff = 0.0
+        total_probability = 0.0
+        for i in range(n_automatons):
+            weighted_payoff += probabilities[i] * payoffs[i]
+            total_probability += probabilities[i]
+        # Normalized by the probability sum, which float32 rounding keeps off 1
+        mean_payoff = weighted_payoff / total_probability
+        at_rest_point = True
+        for i in range(n_automatons):
+            if probabilities[i] > zero and abs(payoffs[i] / mean_payoff - 1.0) >= tolerance:
+                at_rest_point = False
+                break
         
-        for i, automaton in enumerate(automatons):
-            payoff_history[automaton].append(payoffs[i])
+        np.multiply(probabilities, payoffs, probabilities)
+        probabilities /= probabilities.sum()
+        history[period + 1] = probabilities
         
-        min_payoff = np.min(payoffs)
-        if min_payoff < 0:
-            payoffs_adjusted = payoffs - min_payoff + 1
-        else:
-            payoffs_adjusted = payoffs + 1
+        # The float32 update is deterministic, so a state it maps to itself bit for
+        # bit stays there: stopping then gives exactly the output of a full run
+        unchanged = True
+        for i in range(n_automatons):
+            if probabilities[i] != history[period, i]:
+                unchanged = False
+                break
         
-        probabilities = probabilities * payoffs_adjusted
-        probabilities = probabilities / np.sum(probabilities)
-        history.append(probabilities.copy())
+        # At a rest point, fill the remaining periods with the steady state instead
+        # of iterating further
+        if at_rest_point or unchanged:
+            history[period + 2:] = probabilities
+            payoff_history[period + 1:] = payoff_history[period]
+            break
     
-    return np.array(history), payoff_history, strategy_history, payoff_matrices, pairwise_payoffs_history
+    return history, payoff_history
+
+# Results are deterministic, so identical (num_periods, payoff_array) runs come from
+# the cache; Streamlit keys ndarray arguments on their raw bytes
+@st.cache_data(max_entries=32, show_spinner=False)
+def simulate_replication_dynamics(num_periods=100, payoff_array=None):
+    if payoff_array is None:
+        payoff_array = default_payoff_array
+    
+    history, payoff_history = _simulate(payoff_array, num_periods)
+    
+    # The payoff matrix is static, so each automaton's best response is the same every period
+    best_response_idx = payoff_array.argmax(axis=1)
+    
+    return history, payoff_history, best_response_idx
 
 # Sidebar
 with st.sidebar:
@@ -99,28 +136,30 @@ with st.sidebar:
     
     if use_custom_payoff:
         st.markdown("### Customize Payoffs")
-        st.write("Edit payoffs for each automaton vs opponent:")
+        st.write("Edit payoffs for each automaton (row) vs opponent (column), then apply:")
+        
+        # Edits are batched in a form so the app only reruns when they are applied
+        default_payoff_df = pd.DataFrame(default_payoff_matrix).T.astype(float)
+        with st.form("payoff_form"):
+            custom_payoff_df = st.data_editor(
+                default_payoff_df,
+                column_config={
+                    opponent: st.column_config.NumberColumn(required=True)
+                    for opponent in automatons
+                },
+                use_container_width=True
+            )
+            st.form_submit_button("Apply")
         
-        # Create editable payoff matrix
-        custom_payoff_data = {}
-        for automaton in automatons:
-            st.markdown(f"**{automaton}:**")
-            row_data = {}
-            cols = st.columns(4)
-            for idx, opponent in enumerate(automatons):
-                col = cols[idx % 4]
-                default_val = default_payoff_matrix[automaton][opponent]
-                row_data[opponent] = col.number_input(
-                    f"{automaton} vs {opponent}",
-                    value=float(default_val),
-                    step=0.1,
-                    label_visibility="collapsed"
-                )
-            custom_payoff_data[automaton] = row_data
+        # Unlike number inputs, editor cells can be cleared; a NaN payoff would turn
+        # every probability into NaN, so fall back to the default for empty cells
+        if custom_payoff_df.isna().any().any():
+            st.warning("Empty payoff cells were reset to their default values.")
+            custom_payoff_df = custom_payoff_df.fillna(default_payoff_df)
         
-        payoff_matrix = custom_payoff_data
+        payoff_array = payoff_matrix_to_array(custom_payoff_df.T.to_dict())
     else:
-        payoff_matrix = default_payoff_matrix
+        payoff_array = default_payoff_array
         st.markdown("### Using Default Payoff Matrix")
         # Display default matrix
         default_df = pd.DataFrame(default_payoff_matrix).T
@@ -130,24 +169,23 @@ st.info("📊 8 Automatons | ⏱️ Starting: 1/8 each | 🔄 Payoff-based rewei
 
 if st.button("🎮 Run Simulation", use_container_width=True):
     with st.spinner("Running simulation..."):
-        history, payoff_history, strategy_history, payoff_matrices, pairwise_payoffs_history = simulate_replication_dynamics(
+        history, payoff_history, best_response_idx = simulate_replication_dynamics(
             num_periods, 
-            payoff_matrix
+            payoff_array
         )
     
     st.session_state.history = history
     st.session_state.payoff_history = payoff_history
-    st.session_state.strategy_history = strategy_history
-    st.session_state.payoff_matrices = payoff_matrices
-    st.session_state.pairwise_payoffs_history = pairwise_payoffs_history
+    st.session_state.best_response_idx = best_response_idx
+    # Kept so pairwise payoffs can be rebuilt for the periods on display
+    st.session_state.payoff_array = payoff_array
     st.session_state.done = True
 
 if "done" in st.session_state and st.session_state.done:
     history = st.session_state.history
     payoff_history = st.session_state.payoff_history
-    strategy_history = st.session_state.strategy_history
-    payoff_matrices = st.session_state.payoff_matrices
-    pairwise_payoffs_history = st.session_state.pairwise_payoffs_history
+    best_response_idx = st.session_state.best_response_idx
+    simulated_payoff_array = st.session_state.payoff_array
     final_probs = history[-1]
     
     st.header("Results")
@@ -179,15 +217,13 @@ if "done" in st.session_state and st.session_state.done:
     evolution_df = pd.DataFrame(history, columns=automatons)
     evolution_df['t'] = range(len(history))
     
-    fig_evolution = go.Figure()
-    for automaton in automatons:
-        fig_evolution.add_trace(go.Scatter(
-            x=evolution_df['t'],
-            y=evolution_df[automaton],
-            mode='lines',
-            name=automaton,
-            stackgroup='one'
-        ))
+    # Wide-form px.area stacks one area per automaton column in a single call
+    fig_evolution = px.area(
+        evolution_df,
+        x='t',
+        y=list(automatons),
+        labels={'variable': 'Automaton'}
+    )
     
     fig_evolution.update_layout(
         title="Probability Evolution (Stacked)",
@@ -198,17 +234,18 @@ if "done" in st.session_state and st.session_state.done:
     st.plotly_chart(fig_evolution, use_container_width=True)
     
     st.subheader("Payoffs Over Time")
-    payoff_df = pd.DataFrame(payoff_history)
+    payoff_df = pd.DataFrame(payoff_history, columns=automatons)
     payoff_df['t'] = range(len(payoff_df))
     
-    fig_payoff = go.Figure()
-    for automaton in automatons:
-        fig_payoff.add_trace(go.Scatter(
+    fig_payoff = go.Figure(data=[
+        go.Scatter(
             x=payoff_df['t'],
             y=payoff_df[automaton],
             mode='lines',
             name=automaton
-        ))
+        )
+        for automaton in automatons
+    ])
     
     fig_payoff.update_layout(
         title="Average Payoffs",
@@ -222,48 +259,70 @@ if "done" in st.session_state and st.session_state.done:
     st.subheader("📊 Detailed Period Analysis")
     
     # Allow user to select which periods to view
-    periods_to_view = st.slider("Select periods to display", 0, len(payoff_history[automatons[0]]) - 1, (0, min(10, len(payoff_history[automatons[0]]) - 1)))
+    periods_to_view = st.slider("Select periods to display", 0, len(payoff_history) - 1, (0, min(10, len(payoff_history) - 1)))
     
-    # Display payoff breakdown for selected periods
-    for period in range(periods_to_view[0], periods_to_view[1] + 1):
-        st.markdown(f"### t = {period}")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown("**Total Payoff Earned**")
-            period_payoffs = pd.DataFrame({
-                "Automaton": automatons,
-                "Total Payoff": [payoff_history[auto][period] for auto in automatons]
-            }).sort_values("Total Payoff", ascending=False)
-            st.dataframe(period_payoffs, use_container_width=True, hide_index=True)
-        
-        with col2:
-            st.markdown("**Best Response Strategy**")
-            period_strategies = strategy_history[period]
-            strategy_df = pd.DataFrame({
-                "Automaton": list(period_strategies.keys()),
-                "Plays Best Against": list(period_strategies.values())
-            })
-            st.dataframe(strategy_df, use_container_width=True, hide_index=True)
-        
-        st.markdown("**Pairwise Payoffs (Each automaton vs each opponent)**")
-        pairwise_matrix = pairwise_payoffs_history[period]
-        st.dataframe(pairwise_matrix.round(4), use_container_width=True)
+    best_response_names = [automatons[idx] for idx in best_response_idx]
+    strategy_df = pd.DataFrame({
+        "Automaton": automatons,
+        "Plays Best Against": best_response_names
+    })
+    
+    # Display payoff breakdown for the selected periods as one table each
+    first_period, last_period = periods_to_view
+    period_labels = [f"t={period}" for period in range(first_period, last_period + 1)]
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("**Total Payoff Earned**")
+        period_payoffs = pd.DataFrame(
+            payoff_history[first_period:last_period + 1],
+            index=period_labels,
+            columns=automatons
+        )
+        period_payoffs.index.name = "Time"
+        st.dataframe(period_payoffs.round(4), use_container_width=True)
+    
+    with col2:
+        st.markdown("**Best Response Strategy**")
+        st.dataframe(strategy_df, use_container_width=True, hide_index=True)
+    
+    st.markdown("**Pairwise Payoffs (Each automaton vs each opponent)**")
+    # [period, automaton, opponent] for the window, flattened to (period, automaton) rows
+    pairwise_payoffs = simulated_payoff_array * history[first_period:last_period + 1, None, :]
+    pairwise_df = pd.DataFrame(
+        pairwise_payoffs.reshape(-1, len(automatons)),
+        index=pd.MultiIndex.from_product([period_labels, automatons], names=["Time", "Automaton"]),
+        columns=automatons
+    )
+    st.dataframe(pairwise_df.round(4), use_container_width=True)
     
     st.divider()
     st.subheader("📈 Full Payoff Matrix Timeline")
     
-    # Create combined payoff matrix for all periods
-    combined_payoff_df = pd.concat(payoff_matrices, axis=1)
+    # Only the last 20 periods are sent to the browser unless all are requested
+    show_all_periods = st.checkbox("Show all periods", value=False)
+    timeline_start = 0 if show_all_periods else max(0, len(payoff_history) - 20)
+    if not show_all_periods and timeline_start > 0:
+        st.caption(f"Showing the last {len(payoff_history) - timeline_start} of {len(payoff_history)} periods")
+    
+    # Create combined payoff matrix for the shown periods, with periods starting from t=0
+    combined_payoff_df = pd.DataFrame(
+        payoff_history[timeline_start:].T,
+        index=automatons,
+        columns=[f"t={period}" for period in range(timeline_start, len(payoff_history))]
+    )
     st.dataframe(combined_payoff_df.round(4), use_container_width=True)
     
     st.divider()
     st.subheader("🎯 Strategy Selection by Period")
     
-    # Create strategy timeline
-    strategy_timeline_data = {f"t={period}": strategy_history[period] for period in range(len(strategy_history))}
-    strategy_timeline_df = pd.DataFrame(strategy_timeline_data).T
+    # Create strategy timeline (best responses repeat every period)
+    strategy_timeline_df = pd.DataFrame(
+        [best_response_names] * len(payoff_history),
+        index=[f"t={period}" for period in range(len(payoff_history))],
+        columns=automatons
+    )
     strategy_timeline_df.index.name = "Time"
     
     st.dataframe(strategy_timeline_df, use_container_width=True)